@@ -1,37 +1,227 @@
 #!/usr/bin/env python3
-import os, re, sys, requests, shutil, hashlib, concurrent.futures
+import os, re, sys, json, requests, shutil, hashlib, concurrent.futures
+import urllib3
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup, NavigableString
-from markdownify import markdownify
+from markdownify import MarkdownConverter
 
 ATOM_NS = {
     "atom": "http://www.w3.org/2005/Atom",
     "blogger": "http://schemas.google.com/blogger/2018"
 }
 
+# Prefer lxml's C parser (much faster on big posts), fall back to the
+# stdlib parser so the script still runs without it.
+try:
+    from lxml import etree as lxml_etree
+    HTML_PARSER = "lxml"
+except ImportError:
+    lxml_etree = None
+    HTML_PARSER = "html.parser"
+
+ATOM_ENTRY_TAG = "{http://www.w3.org/2005/Atom}entry"
+
+# Optional async download backend: one event loop keeps far more sockets
+# in flight than the thread pool. Falls back to threads when missing.
+try:
+    import asyncio
+    import aiohttp
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# Compiled once so the hot loops skip re's internal cache lookup
+_RE_YOUTUBE = re.compile(r"(?:youtube\.com/embed/|youtu\.be/)([\w-]+)")
+_RE_DRIVE = re.compile(r"drive\.google\.com/file/d/([^/]+)")
+_RE_NONALNUM = re.compile(r"[^a-z0-9\.-]+")
+_RE_DASHES = re.compile(r"-{2,}")
+_RE_HTML_SUFFIX = re.compile(r"\.html$")
+
+# attributes worth keeping when stripping Blogger markup
+_KEEP_ATTRS = frozenset({"src", "href", "alt", "title"})
+
+# Shared session so downloads reuse keep-alive connections instead of
+# paying a TCP+TLS handshake per image. Session is thread-safe for GETs,
+# so the download workers can all use it. Transient server errors are
+# retried with backoff instead of dropping the image.
+SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=requests.adapters.Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 # =====================================================
 # Utility
 # =====================================================
 
 def safe_mkdir(path):
-    if not os.path.isdir(path):
-        os.makedirs(path)
+    os.makedirs(path, exist_ok=True)
+
+# compiled XPath per metadata tag — lxml evaluates these in C, while
+# Element.find re-walks the path in Python on every call
+_XPATH_CACHE = {}
 
 def extract_text(element, tag, ns=ATOM_NS, default=""):
+    if lxml_etree is not None:
+        xp = _XPATH_CACHE.get(tag)
+        if xp is None:
+            xp = _XPATH_CACHE[tag] = lxml_etree.XPath(f"{tag}/text()", namespaces=ns)
+        texts = xp(element)
+        return texts[0].strip() if texts else default
     el = element.find(tag, ns)
     return el.text.strip() if el is not None and el.text is not None else default
 
+def iter_entries(atom_file):
+    """Stream <entry> elements from the export, freeing each one after
+    the caller is done with it so memory stays flat on large dumps."""
+    if lxml_etree is not None:
+        for _, entry in lxml_etree.iterparse(atom_file, tag=ATOM_ENTRY_TAG):
+            yield entry
+            entry.clear()
+            while entry.getprevious() is not None:
+                del entry.getparent()[0]
+    else:
+        for _, entry in ET.iterparse(atom_file):
+            if entry.tag == ATOM_ENTRY_TAG:
+                yield entry
+                entry.clear()
+
+# Per-process download pool, created lazily so worker processes each
+# get their own threads (thread pools do not survive fork/pickle).
+_DOWNLOAD_POOL = None
+
+def _download_pool():
+    global _DOWNLOAD_POOL
+    if _DOWNLOAD_POOL is None:
+        _DOWNLOAD_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=12)
+    return _DOWNLOAD_POOL
+
 def download_file(url, local_path):
     try:
-        r = requests.get(url, stream=True, timeout=10)
+        r = SESSION.get(url, stream=True, timeout=10)
         if r.status_code == 200:
-            with open(local_path, "wb") as f:
-                shutil.copyfileobj(r.raw, f)
+            # decode gzip/deflate transfer encoding before writing
+            r.raw.decode_content = True
+            # write to a temp name and rename when complete, so an
+            # interrupted transfer never leaves a partial file that the
+            # skip-if-exists check would accept on the next run
+            tmp_path = local_path + ".part"
+            try:
+                # 1MB chunks into an unbuffered handle: fewer write() syscalls
+                with open(tmp_path, "wb", buffering=0) as f:
+                    shutil.copyfileobj(r.raw, f, length=1024 * 1024)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, local_path)
             return True
-    except (requests.RequestException, IOError, OSError):
+    except (requests.RequestException, urllib3.exceptions.HTTPError, IOError, OSError):
+        # urllib3 errors surface unwrapped when reading r.raw directly
         pass
     return False
 
+def download_files_async(jobs):
+    """Fetch (url, local_path) jobs concurrently with aiohttp.
+
+    Returns a list of success flags in job order. Images are small, so
+    files are written synchronously after each body is read.
+    """
+    async def fetch(sess, url, local_path):
+        # mirrors the session adapter's Retry policy (3 attempts,
+        # 0.3 backoff, transient server errors only)
+        for attempt in range(3):
+            if attempt:
+                await asyncio.sleep(0.3 * (2 ** (attempt - 1)))
+            try:
+                async with sess.get(url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                    if r.status == 200:
+                        data = await r.read()
+                        # temp name + rename, same as download_file: only
+                        # complete files may satisfy the skip-if-exists check
+                        tmp_path = local_path + ".part"
+                        with open(tmp_path, "wb") as f:
+                            f.write(data)
+                        os.replace(tmp_path, local_path)
+                        return True
+                    if r.status not in (500, 502, 503, 504):
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                pass
+        return False
+
+    async def fetch_all():
+        connector = aiohttp.TCPConnector(limit=64)
+        async with aiohttp.ClientSession(connector=connector) as sess:
+            return await asyncio.gather(*(fetch(sess, url, path) for url, path in jobs))
+
+    return asyncio.run(fetch_all())
+
+# URL -> local path of a completed download. Only touched from the
+# worker's main thread (clean_html runs one post at a time per process),
+# so no lock is needed.
+_DL_CACHE = {}
+
+def download_many(jobs):
+    """Download (url, local_path) jobs, fetching each URL at most once.
+
+    Repeated URLs (blog banners, avatars reused across posts) are copied
+    from the first download instead of re-fetched. Returns a list of
+    success flags in job order.
+    """
+    unique = {}
+    for url, path in jobs:
+        unique.setdefault(url, path)
+
+    # filenames are deterministic, so a file already on disk from an
+    # earlier run is this exact image — re-runs only fetch new images
+    need = {}
+    for url, path in unique.items():
+        if url in _DL_CACHE:
+            continue
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            _DL_CACHE[url] = path
+            continue
+        need[url] = path
+
+    if HAS_AIOHTTP:
+        flags = download_files_async(list(need.items()))
+    else:
+        futures = [_download_pool().submit(download_file, url, path)
+                   for url, path in need.items()]
+        flags = [fut.result() for fut in futures]
+    for (url, path), ok in zip(need.items(), flags):
+        if ok:
+            _DL_CACHE[url] = path
+
+    results = []
+    for url, path in jobs:
+        cached = _DL_CACHE.get(url)
+        if cached is None:
+            results.append(False)
+            continue
+        if cached != path and not os.path.exists(path):
+            try:
+                shutil.copyfile(cached, path)
+            except OSError:
+                results.append(False)
+                continue
+        results.append(True)
+    return results
+
 # =====================================================
 # Tables Markdown Conversion
 # =====================================================
@@ -45,8 +235,8 @@ def has_complex_table(table_tag):
 def row_to_text_cells(row_tag):
     cells = []
     for c in row_tag.find_all(["th","td"], recursive=False):
-        txt = " ".join([s.strip() for s in c.stripped_strings])
-        txt = txt.replace("|", "\\|")
+        # stripped_strings already yields stripped text
+        txt = " ".join(c.stripped_strings).replace("|", "\\|")
         cells.append(txt)
     return cells
 
@@ -67,13 +257,14 @@ def table_to_markdown(table_tag):
     rows = [norm(r) for r in rows]
     header = rows[0]
     body = rows[1:]
-    md = (
-        "\n\n| " + " | ".join(header) + " |\n" +
-        "| " + " | ".join("---" for _ in header) + " |\n"
-    )
+    parts = [
+        "\n\n| " + " | ".join(header) + " |\n",
+        "| " + " | ".join("---" for _ in header) + " |\n",
+    ]
     for r in body:
-        md += "| " + " | ".join(r) + " |\n"
-    return md + "\n\n"
+        parts.append("| " + " | ".join(r) + " |\n")
+    parts.append("\n\n")
+    return "".join(parts)
 
 def convert_tables(soup):
     for table in soup.find_all("table"):
@@ -99,17 +290,20 @@ def convert_links(soup):
 
 def sanitize_filename(filename):
     filename = filename.lower().replace("%20", "-").replace(" ", "-").replace("_", "-")
-    filename = re.sub(r"[^a-z0-9\.-]+", "-", filename)
-    return re.sub(r"-{2,}", "-", filename).strip("-")
+    filename = _RE_NONALNUM.sub("-", filename)
+    return _RE_DASHES.sub("-", filename).strip("-")
 
 def clean_html(html, image_dir, slug):
-    soup = BeautifulSoup(html or "", "html.parser")
+    # no SoupStrainer here: parse_only drops bare text sitting between
+    # top-level tags, and Blogger bodies are full of exactly that
+    # (text separated by <br>), so straining would lose post content
+    soup = BeautifulSoup(html or "", HTML_PARSER)
 
-    # remove unnecessary attributes
+    # remove unnecessary attributes: one dict rebuild per tag instead
+    # of a del through BeautifulSoup's proxy per attribute
     for tag in soup.find_all(True):
-        for attr in list(tag.attrs):
-            if attr not in ["src", "href", "alt", "title"]:
-                del tag[attr]
+        if tag.attrs:
+            tag.attrs = {k: v for k, v in tag.attrs.items() if k in _KEEP_ATTRS}
 
     # === collect images first (faster multi download) ===
     imgJobs = []
@@ -119,23 +313,19 @@ def clean_html(html, image_dir, slug):
             img.decompose()
             continue
         ext = os.path.splitext(src.split("?")[0])[1][:5] or ".jpg"
-        filename = sanitize_filename(f"{slug}-{hashlib.sha256(src.encode()).hexdigest()[:12]}{ext}")
+        digest = hashlib.blake2b(src.encode("utf-8"), digest_size=6).hexdigest()
+        filename = sanitize_filename(f"{slug}-{digest}{ext}")
         local_path = os.path.join(image_dir, filename)
         imgJobs.append((img, src, filename, local_path))
 
-    # always create image dir even if no images will be downloaded
-    safe_mkdir(image_dir)
+    # parallel download, deduplicated by URL across posts
+    results = download_many([(src, path) for _, src, _, path in imgJobs])
 
-    # parallel download
-    with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-        futures = {executor.submit(download_file, src, path): (img, filename) 
-                   for img, src, filename, path in imgJobs}
-        for fut in concurrent.futures.as_completed(futures):
-            img, filename = futures[fut]
-            if fut.result():
-                img.replace_with(NavigableString(f"![{img.get('alt','')}](/posts/{slug}/images/{filename})"))
-            else:
-                img.replace_with(NavigableString(f"![{img.get('alt','')}]({img.get('src')})"))
+    for (img, src, filename, path), ok in zip(imgJobs, results):
+        if ok:
+            img.replace_with(NavigableString(f"![{img.get('alt','')}](/posts/{slug}/images/{filename})"))
+        else:
+            img.replace_with(NavigableString(f"![{img.get('alt','')}]({src})"))
 
     # iframe conversions
     for iframe in list(soup.find_all("iframe")):
@@ -143,11 +333,11 @@ def clean_html(html, image_dir, slug):
         if not src:
             iframe.decompose()
             continue
-        yt = re.search(r"(?:youtube\.com/embed/|youtu\.be/)([\w-]+)", src)
+        yt = _RE_YOUTUBE.search(src)
         if yt:
             iframe.replace_with(NavigableString(f"{{{{< youtube {yt.group(1)} >}}}}"))
             continue
-        gd = re.search(r"drive\.google\.com/file/d/([^/]+)", src)
+        gd = _RE_DRIVE.search(src)
         if gd:
             iframe.replace_with(NavigableString(
                 f"[Download PDF](https://drive.google.com/uc?export=download&id={gd.group(1)})"
@@ -157,14 +347,20 @@ def clean_html(html, image_dir, slug):
 
     convert_tables(soup)
     convert_links(soup)
-    return str(soup)
+    return soup
+
+# one converter per process: options parsing and handler dispatch are
+# set up once instead of per post (workers each import their own copy)
+_MD_CONVERTER = MarkdownConverter(heading_style="ATX", strip=['a'])
 
-def html_to_markdown(html):
+def html_to_markdown(soup):
+    # convert_soup works on the tree clean_html already parsed,
+    # so the HTML is never serialized and re-parsed in between
     try:
-        md = markdownify(html, heading_style="ATX", strip=['a'])
-        return md if md.strip() else html
+        md = _MD_CONVERTER.convert_soup(soup)
+        return md if md.strip() else str(soup)
     except Exception:
-        return html
+        return str(soup)
 
 # =====================================================
 # Frontmatter
@@ -188,63 +384,88 @@ def frontmatter(title, date, updated, tags_yaml, permalink, draft_flag):
 # Main
 # =====================================================
 
-def convert_atom(atom_file, output_dir):
-    tree = ET.parse(atom_file)
-    root = tree.getroot()
-    base_dir = os.path.join(output_dir, "posts")
-    safe_mkdir(base_dir)
-
-    count_posted = 0
-    count_draft = 0
-
-    for entry in root.findall("atom:entry", ATOM_NS):
-        if extract_text(entry, "blogger:type") != "POST":
-            continue
-
-        status = extract_text(entry, "blogger:status")
-        draft_flag = "true" if status == "DRAFT" else "false"
-
-        # === Count draft vs posted ===
-        if draft_flag == "true":
-            count_draft += 1
-        else:
-            count_posted += 1
-
-        title = extract_text(entry, "atom:title", ATOM_NS, "untitled")
-        published = extract_text(entry, "atom:published", ATOM_NS)
-        updated = extract_text(entry, "atom:updated", ATOM_NS)
-        permalink = extract_text(entry, "blogger:filename", ATOM_NS).strip("/")
-
-        # === Fallback if permalink missing ===
-        if not permalink or permalink.strip() == "":
-            title_fallback = extract_text(entry, "atom:title", ATOM_NS, "untitled")
-            if not title_fallback.strip():
-                # fallback to ID if title empty
-                title_fallback = extract_text(entry, "atom:id", ATOM_NS).split("-")[-1]
-            permalink = sanitize_filename(title_fallback.lower().replace(" ", "-")) + ".html"
-        
-        slug = sanitize_filename(re.sub(r"\.html$", "", permalink))
+def entry_payload(entry, base_dir):
+    """Flatten one <entry> into a picklable dict, or None for non-posts."""
+    if extract_text(entry, "blogger:type") != "POST":
+        return None
 
+    status = extract_text(entry, "blogger:status")
+    draft_flag = "true" if status == "DRAFT" else "false"
+
+    title = extract_text(entry, "atom:title", ATOM_NS, "untitled")
+    published = extract_text(entry, "atom:published", ATOM_NS)
+    updated = extract_text(entry, "atom:updated", ATOM_NS)
+    permalink = extract_text(entry, "blogger:filename", ATOM_NS).strip("/")
+
+    # === Fallback if permalink missing ===
+    if not permalink or permalink.strip() == "":
+        title_fallback = extract_text(entry, "atom:title", ATOM_NS, "untitled")
+        if not title_fallback.strip():
+            # fallback to ID if title empty
+            title_fallback = extract_text(entry, "atom:id", ATOM_NS).split("-")[-1]
+        permalink = sanitize_filename(title_fallback.lower().replace(" ", "-")) + ".html"
+
+    slug = sanitize_filename(_RE_HTML_SUFFIX.sub("", permalink))
+
+    tags = [t.attrib.get("term") for t in entry.findall("atom:category", ATOM_NS) if t.attrib.get("term")]
+    # JSON arrays are valid YAML flow sequences, and json.dumps escapes
+    # quotes inside tag names that the hand-rolled join did not
+    tags_yaml = json.dumps(tags, ensure_ascii=False)
+
+    return {
+        "html": extract_text(entry, "atom:content", ATOM_NS, ""),
+        "title": title,
+        "published": published,
+        "updated": updated,
+        "permalink": permalink,
+        "slug": slug,
+        "tags_yaml": tags_yaml,
+        "draft_flag": draft_flag,
+        "post_dir": os.path.join(base_dir, slug),
+    }
+
+def process_entry(payload):
+    """Convert one post end-to-end inside a worker process."""
+    slug = payload["slug"]
+    post_dir = payload["post_dir"]
+    image_dir = os.path.join(post_dir, "images")
+
+    # Create both dirs upfront to avoid misplacement bugs
+    safe_mkdir(post_dir)
+    safe_mkdir(image_dir)
 
-        post_dir = os.path.join(base_dir, slug)
-        image_dir = os.path.join(post_dir, "images")
+    cleaned = clean_html(payload["html"], image_dir, slug)
+    markdown = html_to_markdown(cleaned)
 
-        # Create both dirs upfront to avoid misplacement bugs
-        safe_mkdir(post_dir)
-        safe_mkdir(image_dir)
+    # one write call for the whole post, with a 64KB buffer
+    data = frontmatter(payload["title"], payload["published"], payload["updated"],
+                       payload["tags_yaml"], payload["permalink"], payload["draft_flag"]) + markdown
+    with open(os.path.join(post_dir, "index.md"), "w", encoding="utf-8", buffering=1 << 16) as f:
+        f.write(data)
 
-        html = extract_text(entry, "atom:content", ATOM_NS, "")
-        cleaned = clean_html(html, image_dir, slug)
-        markdown = html_to_markdown(cleaned)
+    return slug, payload["draft_flag"]
 
-        tags = [t.attrib.get("term") for t in entry.findall("atom:category", ATOM_NS) if t.attrib.get("term")]
-        tags_yaml = "[" + ", ".join(f'"{t}"' for t in tags) + "]"
+def convert_atom(atom_file, output_dir):
+    base_dir = os.path.join(output_dir, "posts")
+    safe_mkdir(base_dir)
 
-        with open(os.path.join(post_dir, "index.md"), "w", encoding="utf-8") as f:
-            f.write(frontmatter(title, published, updated, tags_yaml, permalink, draft_flag))
-            f.write(markdown)
+    count_posted = 0
+    count_draft = 0
 
-        print(f"[OK] /posts/{slug}/index.md | draft={draft_flag}")
+    payloads = (p for p in (entry_payload(entry, base_dir)
+                            for entry in iter_entries(atom_file)) if p)
+
+    # Soup + markdownify work is pure Python and GIL-bound, so posts are
+    # converted across worker processes; downloads stay inside each
+    # worker (async backend or its own thread pool).
+    with concurrent.futures.ProcessPoolExecutor() as pe:
+        for slug, draft_flag in pe.map(process_entry, payloads, chunksize=8):
+            # === Count draft vs posted ===
+            if draft_flag == "true":
+                count_draft += 1
+            else:
+                count_posted += 1
+            print(f"[OK] /posts/{slug}/index.md | draft={draft_flag}")
 
     # === Final summary ===
     print(f"\n🎉 Completed extract {count_posted} posted article(s) and {count_draft} draft article(s)!\n")